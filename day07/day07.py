@@ -1,53 +1,154 @@
+import csv
+import json
 import pathlib
 import re
+import sys
 import typing
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from itertools import accumulate
+from itertools import chain
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Literal
+from typing import Optional
 
 from tap import Tap
 
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with a series of records
-    target: str  # The target node to count ancestors
+    targets: List[str]  # The target nodes to count ancestors, or 'all'
+    format: Optional[Literal['csv', 'json']] = None  # Stream one line per target instead of two totals each
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
-        self.add_argument('target')
+        self.add_argument('targets', nargs='+')
+
+
+@dataclass
+class BagGraph:
+    colors: List[str]
+    ids: dict[str, int]
+    # Compressed sparse rows: the children of bag i are childIds[childStart[i]:childStart[i + 1]]
+    childStart: array
+    childIds: array
+    childQuantities: array
+    parentStart: array
+    parentIds: array
+    order: array  # Every bag in topological order, parents before children
 
 
 def main(args: MainArgs):
     with args.file.open('r') as file:
-        rules = readRules(file)
-    print(len(getAncestors(rules, args.target)))
-    print(sum(quantity for quantity, color in getDescendants(rules, args.target)))
+        graph = compileRules(readRules(file))
+    targets = graph.colors if args.targets == ['all'] else args.targets
+    if args.format is None and len(targets) == 1:
+        print(len(getAncestors(graph, targets[0])))
+        print(countDescendants(graph)[graph.ids[targets[0]]] if targets[0] in graph.ids else 0)
+        return
+
+    results = query(graph, targets)
+    if args.format == 'csv':
+        writer = csv.writer(sys.stdout)
+        writer.writerow(('color', 'ancestors', 'contained'))
+        writer.writerows(results)
+    elif args.format == 'json':
+        for color, ancestors, contained in results:
+            print(json.dumps({'color': color, 'ancestors': ancestors, 'contained': contained}))
+    else:
+        for _, ancestors, contained in results:
+            print(ancestors)
+            print(contained)
+
+
+def query(graph: BagGraph, targets: Iterable[str]) -> Iterator[tuple[str, int, int]]:
+    ancestors = ancestorBitsets(graph)
+    contained = countDescendants(graph)
+    for target in targets:
+        bag = graph.ids.get(target)
+        if bag is None:
+            yield target, 0, 0
+        else:
+            # int.bit_count() needs Python 3.10
+            yield target, bin(ancestors[bag]).count('1'), contained[bag]
+
+
+def getAncestors(graph: BagGraph, target: str) -> set[str]:
+    start = graph.ids.get(target)
+    if start is None:
+        return set()
+    visited = bytearray(len(graph.colors))
+    queue = deque([start])
+    ancestors = set()
+    while queue:
+        child = queue.popleft()
+        for parent in graph.parentIds[graph.parentStart[child]:graph.parentStart[child + 1]]:
+            if not visited[parent]:
+                visited[parent] = 1
+                queue.append(parent)
+                ancestors.add(graph.colors[parent])
+    return ancestors
 
 
-def getAncestors(rules: List[tuple[str, List[tuple[int, str]]]], target: str) -> set[str]:
-    parents = {}
-    for parent, children in rules:
-        for quantity, color in children:
-            parents.setdefault(color, []).append(parent)
-
-    nextParents = parents.get(target, [])
-    ancestors = set()
-    while nextParents:
-        parent = nextParents.pop(0)
-        nextParents.extend(parents.get(parent, []))
-        ancestors.add(parent)
+def ancestorBitsets(graph: BagGraph) -> List[int]:
+    # Bit i of ancestors[bag] is set if bag i (transitively) contains bag, working down from the outermost bags
+    ancestors = [0] * len(graph.colors)
+    parentStart, parentIds = graph.parentStart, graph.parentIds
+    for child in graph.order:
+        bits = 0
+        for parent in parentIds[parentStart[child]:parentStart[child + 1]]:
+            bits |= ancestors[parent] | 1 << parent
+        ancestors[child] = bits
     return ancestors
 
 
-def getDescendants(rules: List[tuple[str, List[tuple[int, str]]]], target: str) -> List[tuple[int, str]]:
-    children = {parent: children for parent, children in rules}
+def countDescendants(graph: BagGraph) -> List[int]:
+    # The number of bags inside each bag, working up from the bags with no children
+    # (a list rather than an array since nesting can overflow 64 bits)
+    counts = [0] * len(graph.colors)
+    childStart, childIds, childQuantities = graph.childStart, graph.childIds, graph.childQuantities
+    for parent in reversed(graph.order):
+        counts[parent] = sum(quantity * (1 + counts[child])
+                             for child, quantity in zip(childIds[childStart[parent]:childStart[parent + 1]],
+                                                        childQuantities[childStart[parent]:childStart[parent + 1]]))
+    return counts
 
-    nextChildren: List[tuple[int, str]] = children.get(target, [])
-    descendants = []
-    while nextChildren:
-        parentQuantity, parentColor = nextChildren.pop(0)
-        nextChildren.extend((parentQuantity * childQuantity, childColor)
-                            for childQuantity, childColor in children.get(parentColor, []))
-        descendants.append((parentQuantity, parentColor))
-    return descendants
+
+def compileRules(rules: List[tuple[str, List[tuple[int, str]]]]) -> BagGraph:
+    colors = []
+    ids = {}
+    for parent, children in rules:
+        for color in chain((parent,), (color for _, color in children)):
+            if color not in ids:
+                ids[color] = len(colors)
+                colors.append(color)
+
+    children = [[] for _ in colors]
+    parents = [[] for _ in colors]
+    for parent, edges in rules:
+        for quantity, color in edges:
+            children[ids[parent]].append((ids[color], quantity))
+            parents[ids[color]].append(ids[parent])
+    childStart = array('l', accumulate((len(edges) for edges in children), initial=0))
+    childIds = array('l', (child for edges in children for child, _ in edges))
+    childQuantities = array('q', (quantity for edges in children for _, quantity in edges))
+    parentStart = array('l', accumulate((len(edges) for edges in parents), initial=0))
+    parentIds = array('l', chain.from_iterable(parents))
+
+    # https://en.wikipedia.org/wiki/Topological_sorting#Kahn's_algorithm
+    inDegree = array('l', (len(edges) for edges in parents))
+    order = array('l', (bag for bag, degree in enumerate(inDegree) if degree == 0))
+    for parent in order:
+        for child in childIds[childStart[parent]:childStart[parent + 1]]:
+            inDegree[child] -= 1
+            if inDegree[child] == 0:
+                order.append(child)
+    if len(order) != len(colors):
+        raise ValueError('Bag rules contain a cycle')
+    return BagGraph(colors, ids, childStart, childIds, childQuantities, parentStart, parentIds, order)
 
 
 def readRules(file: typing.TextIO) -> List[tuple[str, List[tuple[int, str]]]]:
@@ -1,65 +1,131 @@
 import pathlib
 import re
+import time
 import typing
+from array import array
+from collections import Counter
 from collections import OrderedDict
+from collections import deque
+from dataclasses import dataclass
+from dataclasses import field
 from typing import List
+from typing import Optional
 
 from tap import Tap
 
+ACC, JMP, NOP = range(3)
+OPCODES = {'acc': ACC, 'jmp': JMP, 'nop': NOP}
+
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with a series of instructions
+    flipped: bool = False  # Also print the index of the instruction flipped to repair the program
+    profile: bool = False  # Also print instruction counts and throughput for the first run
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
 
 
+@dataclass
+class Program:
+    opcodes: array  # array('B') of ACC/JMP/NOP
+    arguments: array  # array('l')
+
+
+@dataclass
+class Profile:
+    iterations: int = 0
+    counts: dict[str, int] = field(default_factory=dict)
+    elapsed: float = 0
+
+
 def main(args: MainArgs):
     with args.file.open('r') as file:
-        instructions = readInstructions(file)
-    success, accumulator, executionPath = execute(instructions)
+        program = decode(readInstructions(file))
+    profile = Profile() if args.profile else None
+    _, accumulator, _ = execute(program, profile)
     print(accumulator)
-    for bugCandidatePointer in reversed(executionPath):
-        bugCandidate = instructions[bugCandidatePointer]
-        if bugCandidate[0] == 'acc':
-            continue
-        instructions[bugCandidatePointer] = ('jmp' if bugCandidate[0] == 'nop' else 'nop', bugCandidate[1])
-        success, accumulator, _ = execute(instructions)
-        if success:
-            break
-        instructions[bugCandidatePointer] = bugCandidate
+    flipped, accumulator = repair(program)
     print(accumulator)
-
-
-def execute(instructions: List[tuple[str, int]]) -> tuple[bool, int, OrderedDict[int, None]]:
+    if args.flipped:
+        print(flipped)
+    if profile is not None:
+        print(f'{profile.iterations} instructions {profile.counts} '
+              f'in {profile.elapsed:.6f}s, {profile.iterations / profile.elapsed:,.0f}/s')
+
+
+def repair(program: Program) -> tuple[int, int]:
+    opcodes, arguments = program.opcodes, program.arguments
+    # Walk the control-flow graph backwards from the end to find every instruction that terminates
+    end = len(opcodes)
+    predecessors = [[] for _ in range(end + 1)]
+    for pointer, (opcode, argument) in enumerate(zip(opcodes, arguments)):
+        target = pointer + argument if opcode == JMP else pointer + 1
+        if 0 <= target <= end:
+            predecessors[target].append(pointer)
+    terminates = bytearray(end + 1)
+    terminates[end] = 1
+    queue = deque([end])
+    while queue:
+        for pointer in predecessors[queue.popleft()]:
+            if not terminates[pointer]:
+                terminates[pointer] = 1
+                queue.append(pointer)
+
+    # Follow the broken program; the fix is the first jmp/nop that lands in the terminating set when flipped
+    _, _, executionPath = execute(program)
+    for pointer in executionPath:
+        opcode = opcodes[pointer]
+        if opcode == ACC:
+            continue
+        target = pointer + 1 if opcode == JMP else pointer + arguments[pointer]
+        if 0 <= target <= end and terminates[target]:
+            flip(program, pointer)
+            success, accumulator, _ = execute(program)
+            flip(program, pointer)
+            if success:
+                return pointer, accumulator
+    raise ValueError('No single jmp/nop flip repairs the program')
+
+
+def execute(program: Program, profile: Optional[Profile] = None) -> tuple[bool, int, OrderedDict[int, None]]:
+    start = time.perf_counter()
+    opcodes, arguments = program.opcodes, program.arguments
+    end = len(opcodes)
+    visited = bytearray(end)
+    path = []
     instructionPointer = 0
     accumulator = 0
-
-    def acc(x):
-        nonlocal accumulator, instructionPointer
-        accumulator += x
-        instructionPointer += 1
-
-    def jmp(x):
-        nonlocal instructionPointer
-        instructionPointer += x
-
-    def nop(_):
-        nonlocal instructionPointer
-        instructionPointer += 1
-
-    cpu = {
-        'acc': acc,
-        'jmp': jmp,
-        'nop': nop
-    }
-
-    executionPath = OrderedDict()
-    while instructionPointer not in executionPath and instructionPointer < len(instructions):
-        executionPath[instructionPointer] = None
-        instruction, argument = instructions[instructionPointer]
-        cpu[instruction](argument)
-    return instructionPointer == len(instructions), accumulator, executionPath
+    while 0 <= instructionPointer < end and not visited[instructionPointer]:
+        visited[instructionPointer] = 1
+        path.append(instructionPointer)
+        opcode = opcodes[instructionPointer]
+        if opcode == ACC:
+            accumulator += arguments[instructionPointer]
+            instructionPointer += 1
+        elif opcode == JMP:
+            instructionPointer += arguments[instructionPointer]
+        else:
+            instructionPointer += 1
+    executionPath = OrderedDict.fromkeys(path)
+
+    if profile is not None:
+        profile.elapsed += time.perf_counter() - start
+        profile.iterations += len(path)
+        names = {opcode: name for name, opcode in OPCODES.items()}
+        for opcode, count in Counter(opcodes[pointer] for pointer in path).items():
+            profile.counts[names[opcode]] = profile.counts.get(names[opcode], 0) + count
+    return instructionPointer == end, accumulator, executionPath
+
+
+def flip(program: Program, pointer: int):
+    opcodes = program.opcodes
+    opcodes[pointer] = NOP if opcodes[pointer] == JMP else JMP
+
+
+def decode(instructions: List[tuple[str, int]]) -> Program:
+    return Program(array('B', [OPCODES[instruction] for instruction, _ in instructions]),
+                   array('l', [argument for _, argument in instructions]))
 
 
 def readInstructions(file: typing.TextIO) -> List[tuple[str, int]]:
@@ -18,55 +18,96 @@ class MainArgs(Tap):
 def main(args: MainArgs):
     with args.file.open('r') as file:
         ferry = np.genfromtxt(file, dtype=str, delimiter=1)
-    part1Result = part1(ferry, args.empty, args.occupied)
-    print(np.count_nonzero(part1Result == args.occupied))
-    part2Result = part2(ferry, args.empty, args.occupied)
-    print(np.count_nonzero(part2Result == args.occupied))
-
-
-def part1(ferry: np.ndarray, empty: str, occupied: str) -> np.ndarray:
-    update = np.array(['x'])
-    while (update != '').any():
-        # https://stackoverflow.com/a/53127289/3491874
-        people = np.pad(np.where(ferry == occupied, 1, 0), 1)
-        neighbors = np.sum([
-            people[:-2, :-2],  # NW
-            people[:-2, 1:-1],  # N
-            people[:-2, 2:],  # NE
-            people[1:-1, :-2],  # W
-            people[1:-1, 2:],  # E
-            people[2:, :-2],  # SW
-            people[2:, 1:-1],  # S
-            people[2:, 2:]  # SE
-        ], 0)
-        update = np.where(np.logical_and(ferry == empty, neighbors == 0), occupied, '')
-        update = np.where(np.logical_and(ferry == occupied, neighbors >= 4), empty, update)
-        ferry = np.where(update != '', update, ferry)
-    return ferry
-
-
-def part2(ferry: np.ndarray, empty: str, occupied: str) -> np.ndarray:
-    addTuples = lambda x, y: tuple(sum(i) for i in zip(x, y))
-    update = np.array(['x'])
-    while (update != '').any():
-        neighbors = np.zeros(ferry.shape, dtype=int)
-        for index, value in np.ndenumerate(ferry):
-            if value == empty or value == occupied:
-                n = 0
-                for direction in [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]:
-                    position = addTuples(index, direction)
-                    while all(0 <= a < b for a, b in zip(position, ferry.shape)):
-                        if ferry[position] == empty:
-                            break
-                        if ferry[position] == occupied:
-                            n += 1
-                            break
-                        position = addTuples(position, direction)
-                neighbors[index] = n
-        update = np.where(np.logical_and(ferry == empty, neighbors == 0), occupied, '')
-        update = np.where(np.logical_and(ferry == occupied, neighbors >= 5), empty, update)
-        ferry = np.where(update != '', update, ferry)
-    return ferry
+    seats = np.logical_or(ferry == args.empty, ferry == args.occupied)
+    people = ferry == args.occupied
+    print(np.count_nonzero(part1(seats, people)))
+    print(np.count_nonzero(part2(seats, people)))
+
+
+def part1(seats: np.ndarray, people: np.ndarray) -> np.ndarray:
+    rows, columns = seats.shape
+    padded = np.zeros((rows + 2, columns + 2), dtype=np.uint8)
+    current = padded[1:-1, 1:-1]
+    current[...] = people
+    neighbors = np.empty(seats.shape, dtype=np.uint8)
+    changed = np.empty(seats.shape, dtype=bool)
+    scratch = np.empty(seats.shape, dtype=bool)
+    # https://stackoverflow.com/a/53127289/3491874
+    around = [
+        padded[:-2, :-2],  # NW
+        padded[:-2, 1:-1],  # N
+        padded[:-2, 2:],  # NE
+        padded[1:-1, :-2],  # W
+        padded[1:-1, 2:],  # E
+        padded[2:, :-2],  # SW
+        padded[2:, 1:-1],  # S
+        padded[2:, 2:]  # SE
+    ]
+    while True:
+        np.copyto(neighbors, around[0])
+        for view in around[1:]:
+            np.add(neighbors, view, out=neighbors)
+        if step(seats, current, neighbors, 4, changed, scratch) == 0:
+            break
+    return current.astype(bool)
+
+
+def part2(seats: np.ndarray, people: np.ndarray) -> np.ndarray:
+    visible = lineOfSight(seats)
+    # One flag per seat, plus an always-empty seat for directions with nothing in sight
+    current = np.append(people[seats], False).astype(np.uint8)
+    seated = current[:-1]
+    gathered = np.empty(visible.shape, dtype=np.uint8)
+    neighbors = np.empty(seated.shape, dtype=np.uint8)
+    changed = np.empty(seated.shape, dtype=bool)
+    scratch = np.empty(seated.shape, dtype=bool)
+    allSeats = np.ones(seated.shape, dtype=bool)
+    while True:
+        np.take(current, visible, out=gathered)
+        gathered.sum(0, dtype=np.uint8, out=neighbors)
+        if step(allSeats, seated, neighbors, 5, changed, scratch) == 0:
+            break
+    result = np.zeros(seats.shape, dtype=bool)
+    result[seats] = seated
+    return result
+
+
+def step(seats: np.ndarray, people: np.ndarray, neighbors: np.ndarray, crowded: int,
+         changed: np.ndarray, scratch: np.ndarray) -> int:
+    # Occupied seats with too many neighbors are vacated and empty seats with no neighbors are filled,
+    # updating people in place and returning the number of seats that changed
+    np.greater_equal(neighbors, crowded, out=changed)
+    np.logical_and(changed, people, out=changed)
+    np.equal(neighbors, 0, out=scratch)
+    np.logical_and(scratch, seats, out=scratch)
+    np.greater(scratch, people, out=scratch)
+    np.logical_or(changed, scratch, out=changed)
+    np.bitwise_xor(people, changed, out=people)
+    return np.count_nonzero(changed)
+
+
+def lineOfSight(seats: np.ndarray) -> np.ndarray:
+    # The first seat visible in each direction from every seat, numbering seats in row-major order
+    # and using the number of seats when there isn't one
+    count = np.count_nonzero(seats)
+    order = np.full(seats.shape, count)
+    order[seats] = np.arange(count)
+    directions = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+    return np.stack([firstInSight(order, count, *direction)[seats] for direction in directions])
+
+
+def firstInSight(order: np.ndarray, count: int, dRow: int, dColumn: int) -> np.ndarray:
+    if dRow == 0:
+        return firstInSight(order.T, count, dColumn, dRow).T
+    rows, columns = order.shape
+    padded = np.pad(order, 1, constant_values=count)
+    nearest = np.full(padded.shape, count)
+    # Sweep rows against the direction of sight so the row being looked into is already done
+    ahead = slice(1 + dColumn, 1 + dColumn + columns)
+    for row in (range(rows, 0, -1) if dRow == 1 else range(1, rows + 1)):
+        seen = padded[row + dRow, ahead]
+        nearest[row, 1:-1] = np.where(seen != count, seen, nearest[row + dRow, ahead])
+    return nearest[1:-1, 1:-1]
 
 
 if __name__ == '__main__':
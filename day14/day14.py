@@ -2,9 +2,8 @@ import pathlib
 import re
 import typing
 from dataclasses import dataclass
-from functools import reduce
-from operator import or_ as logical_or
 from typing import Iterable
+from typing import List
 from typing import Union
 
 from tap import Tap
@@ -28,13 +27,21 @@ class MaskInstruction:
     mask: str
 
 
+@dataclass
+class FloatingWrite:
+    address: int  # The fixed address bits, 0 where floating
+    floating: int  # The floating address bits
+    value: int
+
+
 def main(args: MainArgs):
     with args.file.open('r') as file:
         memory = part1(readInstructions(file))
         print(sum(memory.values()))
         file.seek(0)
-        memory = part2(readInstructions(file))
-        print(sum(memory.values()))
+        writes = part2(readInstructions(file))
+        # Each write covers 2^(floating bits) addresses
+        print(sum(write.value << bin(write.floating).count('1') for write in writes))
 
 
 def part1(instructions: Iterable[Union[MemInstruction, MaskInstruction]]) -> dict[int, int]:
@@ -51,26 +58,38 @@ def part1(instructions: Iterable[Union[MemInstruction, MaskInstruction]]) -> dic
     return memory
 
 
-def part2(instructions: Iterable[Union[MemInstruction, MaskInstruction]]) -> dict[int, int]:
-    memory = dict()
-    mask = None
+def part2(instructions: Iterable[Union[MemInstruction, MaskInstruction]]) -> List[FloatingWrite]:
+    # Memory is kept as writes to disjoint sets of addresses, so nothing is ever enumerated
+    writes = []
+    ones = None
     floating = None
     for instruction in instructions:
         if isinstance(instruction, MaskInstruction):
-            mask = int(''.join('1' if c == 'X' else c for c in instruction.mask), 2)
-            floating = [idx for idx, c in enumerate(reversed(instruction.mask)) if c == 'X']
-        elif floating:
-            # Each floating bit is a binary digit, so n bits have 2^n permutations
-            for permutation in range(2 ** len(floating)):
-                # Isolate each digit of the permutation then shift the remaining places to put it in floating spot
-                # Combine these with OR to produce a set of floating digits in the appropriate spots
-                floatValue = reduce(
-                    logical_or,
-                    ((permutation & 1 << digit) << (floating[digit] - digit) for digit in range(len(floating))))
-                # Applying the mask with OR forces 1 into all the X spots, then AND replaces float digits
-                memory[(instruction.address | mask) & ~floatValue] = instruction.value
-
-    return memory
+            ones = int(''.join('1' if c == '1' else '0' for c in instruction.mask), 2)
+            floating = int(''.join('1' if c == 'X' else '0' for c in instruction.mask), 2)
+        else:
+            write = FloatingWrite((instruction.address | ones) & ~floating, floating, instruction.value)
+            writes = [piece for previous in writes for piece in subtract(previous, write)]
+            writes.append(write)
+    return writes
+
+
+def subtract(write: FloatingWrite, overwrite: FloatingWrite) -> List[FloatingWrite]:
+    # A bit fixed differently in both means the writes don't overlap
+    if (write.address ^ overwrite.address) & ~write.floating & ~overwrite.floating:
+        return [write]
+    # Otherwise peel off what's left of write one bit at a time: for each bit that floats in write but is
+    # fixed in overwrite, the half with the other value is outside overwrite, and the rest carries on
+    pieces = []
+    address, floating = write.address, write.floating
+    split = write.floating & ~overwrite.floating
+    while split:
+        bit = split & -split
+        split ^= bit
+        floating ^= bit
+        pieces.append(FloatingWrite(address | ~overwrite.address & bit, floating, write.value))
+        address |= overwrite.address & bit
+    return pieces
 
 
 def readInstructions(file: typing.TextIO) -> Iterable[Union[MemInstruction, MaskInstruction]]:
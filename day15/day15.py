@@ -1,43 +1,77 @@
+import mmap
 import pathlib
+from array import array
 from typing import Iterable
+from typing import Optional
 
 from tap import Tap
 
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with a list of integers
-    ordinal: int  # The ordinal of the number to return
+    ordinals: list[int]  # The ordinals of the numbers to return
+    sequence: Optional[pathlib.Path] = None  # A binary file to write the full spoken sequence to (native int32)
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
-        self.add_argument('ordinal')
+        self.add_argument('ordinals', nargs='+')
 
 
 def main(args: MainArgs):
     with args.file.open('r') as file:
-        starting = (int(line) for line in file)
-        last = numbersGame(starting, args.ordinal)
-    print(last)
-
-
-def numbersGame(starting: Iterable[int], turns: int) -> int:
-    turn = 0
-    spoken = None
-    priors = None
-    numbers = dict()
-    for spoken in starting:
-        priors = numbers.setdefault(spoken, [])
-        priors.append(turn)
-        turn += 1
-    while turn < turns:
-        if len(priors) > 1:
-            spoken = priors[-1] - priors.pop(0)
+        starting = [int(line) for line in file]
+    if min(args.ordinals) < 1:
+        raise ValueError(f'Ordinals start at 1, got {min(args.ordinals)}')
+    if args.sequence is None:
+        spoken = numbersGame(starting, args.ordinals)
+    else:
+        length = max(max(args.ordinals), len(starting)) * array('i').itemsize
+        with args.sequence.open('w+b') as file:
+            file.truncate(length)
+            with mmap.mmap(file.fileno(), length) as buffer, memoryview(buffer).cast('i') as sequence:
+                spoken = numbersGame(starting, args.ordinals, sequence)
+    for ordinal in args.ordinals:
+        print(spoken[ordinal])
+
+
+# Numbers spoken after the starting numbers are gaps between turns, so they are always less than turns
+# and fit the flat table; only starting numbers can overflow into the dict
+def numbersGame(starting: Iterable[int], ordinals: Iterable[int],
+                sequence: Optional[memoryview] = None) -> dict[int, int]:
+    numbers = list(starting)
+    ordinals = sorted(set(ordinals))
+    size = max(ordinals[-1], 1)
+    lastSpoken = array('i', [0]) * size  # Turn (1-based) each number was last spoken, 0 if never
+    overflow = dict()
+
+    spoken = numbers[-1]
+    for turn, number in enumerate(numbers[:-1], 1):
+        if 0 <= number < size:
+            lastSpoken[number] = turn
         else:
-            spoken = 0
-        priors = numbers.setdefault(spoken, [])
-        priors.append(turn)
-        turn += 1
-    return spoken
+            overflow[number] = turn
+    if sequence is not None:
+        sequence[:len(numbers)] = array('i', numbers)
+
+    results = dict()
+    turn = len(numbers)
+    for ordinal in ordinals:
+        if ordinal <= len(numbers):
+            results[ordinal] = numbers[ordinal - 1]
+            continue
+        for turn in range(turn, ordinal):
+            if 0 <= spoken < size:
+                prior = lastSpoken[spoken]
+                lastSpoken[spoken] = turn
+            else:
+                prior = overflow.get(spoken, 0)
+                overflow[spoken] = turn
+            spoken = turn - prior if prior else 0
+            if sequence is not None:
+                sequence[turn] = spoken
+        turn = ordinal
+        results[ordinal] = spoken
+    return results
 
 
 if __name__ == '__main__':
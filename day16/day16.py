@@ -1,8 +1,10 @@
 import pathlib
 import re
 from math import prod
+from typing import List
 from typing import TextIO
 
+import numpy as np
 from tap import Tap
 
 
@@ -15,23 +17,18 @@ class MainArgs(Tap):
 
 def main(args: MainArgs):
     with args.file.open('r') as file:
-        rules, myTicket, tickets = readFile(file)
+        fields, ranges, myTicket, tickets = readFile(file)
 
-    print(sum(value
-              for ticket in tickets
-              for value in ticket
-              if not any(valid(value) for valid in rules.values())))
+    # One lookup per value gives the rules that accept it, all in one pass over the tickets
+    table = compileRules(ranges)
+    masks = table[np.minimum(tickets, len(table) - 1)]
+    invalid = masks == 0
+    print(tickets[invalid].sum())
 
-    tickets = [ticket
-               for ticket in tickets
-               if all(any(valid(value) for valid in rules.values()) for value in ticket)]
-
-    ticketColumns = ([ticket[i] for ticket in tickets] for i in range(len(rules)))
-
-    possibleFields = [{field
-                       for field, valid in rules.items()
-                       if all(valid(value) for value in column)}
-                      for column in ticketColumns]
+    # Bit r of a column's candidates is set if rule r accepts every value in that column of the valid tickets
+    candidates = np.bitwise_and.reduce(masks[~invalid.any(axis=1)], axis=0)
+    possibleFields = [{field for rule, field in enumerate(fields) if mask >> rule & 1}
+                      for mask in candidates.tolist()]
 
     while any(len(possibleField) > 1 for possibleField in possibleFields):
         for certainField in (x for x in possibleFields if len(x) == 1):
@@ -44,29 +41,36 @@ def main(args: MainArgs):
                if field.pop().split()[0] == 'departure'))
 
 
-def readFile(file: TextIO):
-    rules = {}
+def compileRules(ranges: np.ndarray) -> np.ndarray:
+    # table[value] has bit r set if rule r accepts value, with a final 0 for every value above the largest bound
+    if len(ranges) > 64:
+        raise ValueError(f'{len(ranges)} rules do not fit in a 64-bit mask')
+    values = np.arange(ranges.max() + 2)
+    lower1, upper1, lower2, upper2 = (ranges[:, i, np.newaxis] for i in range(4))
+    accepts = ((lower1 <= values) & (values <= upper1)) | ((lower2 <= values) & (values <= upper2))
+    bits = np.left_shift(np.uint64(1), np.arange(len(ranges), dtype=np.uint64))
+    return np.bitwise_or.reduce(np.where(accepts, bits[:, np.newaxis], np.uint64(0)), axis=0)
+
+
+def readFile(file: TextIO) -> tuple[List[str], np.ndarray, List[int], np.ndarray]:
+    fields = []
+    ranges = []
     rulePattern = \
         re.compile(r'^(?P<field>[\w ]+): (?P<lower1>\d+)-(?P<upper1>\d+) or (?P<lower2>\d+)-(?P<upper2>\d+)\s*$')
 
     while match := rulePattern.match(next(file, '')):
-        lower1 = int(match.group('lower1'))
-        upper1 = int(match.group('upper1'))
-        lower2 = int(match.group('lower2'))
-        upper2 = int(match.group('upper2'))
-        # https://stackoverflow.com/a/2295372/3491874
-        # Use default parameters to capture the values in lambda
-        rules[match.group('field')] = \
-            lambda x, l1=lower1, u1=upper1, l2=lower2, u2=upper2: l1 <= x <= u1 or l2 <= x <= u2
+        fields.append(match.group('field'))
+        ranges.append([int(match.group(bound)) for bound in ('lower1', 'upper1', 'lower2', 'upper2')])
 
     next(file)  # Header
     myTicket = [int(x) for x in next(file).split(',')]
     next(file)  # Blank line
 
     next(file)  # Header
-    tickets = [[int(x) for x in line.split(',')] for line in file]
+    # Parsing in NumPy rather than one int() per value matters with millions of tickets
+    tickets = np.fromstring(file.read().strip().replace('\n', ','), dtype=np.int64, sep=',')
 
-    return rules, myTicket, tickets
+    return fields, np.array(ranges, dtype=np.int64), myTicket, tickets.reshape(-1, len(myTicket))
 
 
 if __name__ == '__main__':
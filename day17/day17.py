@@ -1,5 +1,8 @@
+import math
 import pathlib
+from itertools import product
 from typing import List
+from typing import Optional
 from typing import Union
 
 import numpy as np
@@ -11,15 +14,18 @@ class MainArgs(Tap):
     inactive: str  # The character representing an inactive point/cube
     active: str  # The character representing an active point/cube
     dimensions: int  # The number of dimensions
-    size: int  # The size of the hypercube in each dimension
+    size: Optional[int] = None  # The size of the hypercube in each dimension, to use the dense engine
     cycles: int  # The number of cycles to run
+    report: bool = False  # Print the number of cells processed in each cycle
+    full: bool = False  # Simulate every active cell instead of only the canonical region of the symmetric world
+    verify: bool = False  # Run both the full and the symmetric simulation and compare them
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
         self.add_argument('inactive')
         self.add_argument('active')
         self.add_argument('dimensions')
-        self.add_argument('size')
+        self.add_argument('size', nargs='?')
         self.add_argument('cycles')
 
 
@@ -27,6 +33,26 @@ def main(args: MainArgs):
     with args.file.open('r') as file:
         start = np.genfromtxt(file, dtype=str, delimiter=1, comments=None)
 
+    if args.size is None:
+        layer = np.argwhere(start == args.active)
+        cells = np.hstack([np.zeros((len(layer), args.dimensions - 2), dtype=np.int64), layer])
+        processed = []
+        if args.full:
+            active = len(runSparse(cells, args.cycles, processed))
+        else:
+            active = int(orbitSizes(runSymmetric(cells, args.dimensions - 2, args.cycles, processed),
+                                    args.dimensions - 2).sum())
+        print(active)
+        if args.report:
+            for cycle, count in enumerate(processed, 1):
+                print(f'cycle {cycle}: {count} cells')
+        if args.verify:
+            other = (int(orbitSizes(runSymmetric(cells, args.dimensions - 2, args.cycles),
+                                    args.dimensions - 2).sum())
+                     if args.full else len(runSparse(cells, args.cycles)))
+            print('verified' if other == active else f'mismatch: {other}')
+        return
+
     origin = [args.size // 2 for _ in range(args.dimensions)]
 
     world = np.full([args.size for _ in range(args.dimensions)], args.inactive)
@@ -50,6 +76,80 @@ def run(world: np.ndarray, inactive: str, active: str, cycles: int) -> np.ndarra
     return world
 
 
+def runSparse(cells: np.ndarray, cycles: int, processed: Optional[List[int]] = None,
+              denseVolume: int = 2 ** 26) -> np.ndarray:
+    # cells holds the coordinates of active cells, one per row
+    offsets = np.array(list(product((-1, 0, 1), repeat=cells.shape[1])))
+    offsets = offsets[np.any(offsets != 0, axis=1)]
+    for _ in range(cycles):
+        if len(cells) == 0:
+            break
+        # Flatten coordinates to integer keys within the current bounds, grown by one in every direction
+        low = cells.min(0) - 1
+        extent = cells.max(0) + 2 - low
+        strides = np.cumprod(np.concatenate([[1], extent[:0:-1]]))[::-1]
+        keys = (cells - low) @ strides
+        volume = int(np.prod(extent))
+        if volume <= denseVolume:
+            # Each shift of a set of distinct keys is distinct, so a plain fancy-index increment counts correctly
+            counts = np.zeros(volume, dtype=np.uint16)
+            for shift in offsets @ strides:
+                counts[keys + shift] += 1
+            candidates = np.flatnonzero(counts)
+            neighbors = counts[candidates]
+        else:
+            candidates, neighbors = np.unique((keys[:, None] + offsets @ strides).ravel(), return_counts=True)
+        if processed is not None:
+            processed.append(len(candidates))
+        alive = np.isin(candidates, keys, assume_unique=True)
+        keys = candidates[(neighbors == 3) | (alive & (neighbors == 2))]
+        cells = np.stack(np.unravel_index(keys, tuple(extent)), axis=1) + low
+    return cells
+
+
+def runSymmetric(cells: np.ndarray, extra: int, cycles: int, processed: Optional[List[int]] = None) -> np.ndarray:
+    # The starting layer sits at 0 in the first `extra` dimensions, so the world stays symmetric under
+    # negating or swapping them; only cells whose extra coordinates are non-negative and sorted are kept
+    offsets = np.array(list(product((-1, 0, 1), repeat=cells.shape[1])))
+    offsets = offsets[np.any(offsets != 0, axis=1)]
+    for _ in range(cycles):
+        if len(cells) == 0:
+            break
+        # The neighbors of cell c in the class of cell a, N(c -> a), satisfy
+        # |orbit(a)| * N(a -> c) = |orbit(c)| * N(c -> a), so push weighted counts from each active cell
+        targets = canonical((cells[:, None, :] + offsets).reshape(-1, cells.shape[1]), extra)
+        low = targets.min(0)
+        extent = targets.max(0) + 1 - low
+        strides = np.cumprod(np.concatenate([[1], extent[:0:-1]]))[::-1]
+        candidates, inverse = np.unique((targets - low) @ strides, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), np.repeat(orbitSizes(cells, extra), len(offsets)))
+        coordinates = np.stack(np.unravel_index(candidates, tuple(extent)), axis=1) + low
+        neighbors = np.rint(weights / orbitSizes(coordinates, extra)).astype(np.int64)
+        if processed is not None:
+            processed.append(len(candidates))
+        alive = np.isin(candidates, (cells - low) @ strides, assume_unique=True)
+        cells = coordinates[(neighbors == 3) | (alive & (neighbors == 2))]
+    return cells
+
+
+def canonical(cells: np.ndarray, extra: int) -> np.ndarray:
+    cells = cells.copy()
+    cells[:, :extra] = np.sort(np.abs(cells[:, :extra]), axis=1)
+    return cells
+
+
+def orbitSizes(cells: np.ndarray, extra: int) -> np.ndarray:
+    # The number of cells each canonical cell stands for: 2^(non-zero extra coordinates) sign flips
+    # times extra! / (product of repeated coordinate counts!) distinct orderings
+    coordinates = cells[:, :extra]
+    sizes = np.left_shift(1, np.count_nonzero(coordinates, axis=1)) * math.factorial(extra)
+    run = np.ones(len(cells), dtype=np.int64)
+    for i in range(1, extra):
+        run = np.where(coordinates[:, i] == coordinates[:, i - 1], run + 1, 1)
+        sizes //= run
+    return sizes
+
+
 def slicer(dimensions: int, includeOrigin: bool = False) -> List[tuple[Union[slice, list[slice]]]]:
     slices = [slice(None, -2), slice(1, -1), slice(2, None)]
     return [tuple(slices[y // 3 ** x % 3]
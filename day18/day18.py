@@ -1,64 +1,139 @@
+import operator
 import pathlib
+import re
+import time
+import typing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+from typing import Iterable
+from typing import List
+from typing import Union
 
 from tap import Tap
 
+OPERATIONS = {'+': operator.add, '*': operator.mul}
+# Operator -> binding strength, higher binds tighter and equal strengths go left to right
+PRECEDENCE = tuple[tuple[str, int], ...]
+PRECEDENCES: dict[str, PRECEDENCE] = {
+    'left-to-right': (('+', 1), ('*', 1)),
+    'addition-first': (('+', 2), ('*', 1)),
+}
+TOKEN = Union[int, str]
+
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with expressions to evaluate
+    schemes: List[str] = list(PRECEDENCES)  # The precedence schemes to total the expressions under
+    workers: int = 1  # Evaluate chunks of the file in this many processes
+    chunk: int = 10000  # Lines per chunk
+    report: bool = False  # Also print how many lines were evaluated per second
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
+        self.add_argument('--schemes', nargs='+', choices=list(PRECEDENCES))
 
 
 def main(args: MainArgs):
+    start = time.perf_counter()
     with args.file.open('r') as file:
-        print(sum(evaluate(line, set()) for line in file))
-        file.seek(0)
-        print(sum(evaluate(line, {'*'}) for line in file))
+        lines, totals = evaluateFile(file, args.schemes, args.workers, args.chunk)
+    elapsed = time.perf_counter() - start
+    for total in totals:
+        print(total)
+    if args.report:
+        print(f'{lines} lines in {elapsed:.3f}s, {lines / elapsed:,.0f} lines/s')
 
 
-def evaluate(expression: str, deferred: set[str]) -> int:
-    operations = {
-        '+': lambda x, y: x + y,
-        '*': lambda x, y: x * y
-    }
-    operands = []
-    operators = []
-    i = 0
-    while i < len(expression):
-        character = expression[i]
-        if character.isspace():
-            i += 1
-            continue
-        if character in {'+', '*'}:
-            operators.append(character)
-            i += 1
-            continue
-        j = i + 1
-        if character.isdigit():
-            while j < len(expression) and expression[j].isdigit():
-                j += 1
-            current = int(expression[i:j])
+def evaluateFile(file: typing.TextIO, schemes: List[str], workers: int = 1, chunkSize: int = 10000) \
+        -> tuple[int, List[int]]:
+    # Stream the file once in chunks, with at most two chunks per worker in flight, and add up the partial sums
+    chunks = iter(lambda: list(islice(file, chunkSize)), [])
+    lines, totals = 0, [0] * len(schemes)
+    if workers == 1:
+        results = (evaluateChunk(chunk, schemes) for chunk in chunks)
+    else:
+        results = evaluateChunks(chunks, schemes, workers)
+    for count, partialTotals in results:
+        lines += count
+        totals = [total + partialTotal for total, partialTotal in zip(totals, partialTotals)]
+    return lines, totals
+
+
+def evaluateChunks(chunks: Iterable[List[str]], schemes: List[str], workers: int) \
+        -> Iterable[tuple[int, List[int]]]:
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(evaluateChunk, chunk, schemes))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def evaluateChunk(lines: List[str], schemes: List[str]) -> tuple[int, List[int]]:
+    precedences = [PRECEDENCES[scheme] for scheme in schemes]
+    totals = [0] * len(schemes)
+    for line in lines:
+        for i, precedence in enumerate(precedences):
+            totals[i] += evaluate(line, precedence)
+    return len(lines), totals
+
+
+def evaluate(expression: str, precedence: PRECEDENCE) -> int:
+    # Reverse Polish notation evaluates with a single stack and no recursion
+    stack = []
+    for token in compileExpression(expression, precedence):
+        if type(token) is int:
+            stack.append(token)
         else:
-            depth = 1
-            j = i + 1
-            while j < len(expression) and depth > 0:
-                if expression[j] == '(':
-                    depth += 1
-                elif expression[j] == ')':
-                    depth -= 1
-                j += 1
-            current = evaluate(expression[i + 1:j - 1], deferred)
-        i = j
-
-        if not operands or operators[-1] in deferred:
-            operands.append(current)
+            y = stack.pop()
+            stack[-1] = OPERATIONS[token](stack[-1], y)
+    return stack[0]
+
+
+@lru_cache(maxsize=1024)
+def compileExpression(expression: str, precedence: PRECEDENCE) -> tuple[TOKEN, ...]:
+    # https://en.wikipedia.org/wiki/Shunting-yard_algorithm
+    strengths = dict(precedence)
+    output = []
+    operators = []
+    for token in tokenize(expression):
+        if type(token) is int:
+            output.append(token)
+        elif token == '(':
+            operators.append(token)
+        elif token == ')':
+            while operators and operators[-1] != '(':
+                output.append(operators.pop())
+            if not operators:
+                raise ValueError(f'Unmatched ) in {expression!r}')
+            operators.pop()
         else:
-            operands.append(operations[operators.pop()](operands.pop(), current))
+            while operators and operators[-1] != '(' and strengths[operators[-1]] >= strengths[token]:
+                output.append(operators.pop())
+            operators.append(token)
+    while operators:
+        if operators[-1] == '(':
+            raise ValueError(f'Unmatched ( in {expression!r}')
+        output.append(operators.pop())
+    return tuple(output)
+
 
-    while len(operators) > 0:
-        operands.append(operations[operators.pop()](operands.pop(), operands.pop()))
-    return operands[0]
+@lru_cache(maxsize=1024)
+def tokenize(expression: str) -> tuple[TOKEN, ...]:
+    # Evaluating one expression under several precedences only scans it once
+    tokens = []
+    for match in re.finditer(r'(?P<number>\d+)|(?P<symbol>[+*()])|\S', expression):
+        if match.group('number') is not None:
+            tokens.append(int(match.group('number')))
+        elif match.group('symbol') is not None:
+            tokens.append(match.group('symbol'))
+        else:
+            raise ValueError(f'Unexpected {match.group()!r} in {expression!r}')
+    return tuple(tokens)
 
 
 if __name__ == '__main__':
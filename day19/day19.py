@@ -1,63 +1,251 @@
 import pathlib
 import re
-from functools import reduce
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import List
+from typing import Literal
+from typing import Optional
 from typing import TextIO
 
 from tap import Tap
 
+PATTERN_LIMIT = 1 << 20  # Longer regular expressions fall back to the chart parser
+
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with a list of rules and data
+    backend: Literal['auto', 'chart', 'regex'] = 'auto'  # 'auto' uses the regex whenever the rules can be unrolled
+    workers: int = 1  # Split the messages across this many processes
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
 
 
-def main(args: MainArgs):
-    with args.file.open('r') as file:
-        rules, messages = readFile(file)
-
-    print(sum(1
-              for result in (rules[0]({message})
-                             for message in messages)
-              if '' in result))
+@dataclass
+class Grammar:
+    # Indexed by rule id, with gaps in the numbering left as None/empty
+    letters: List[Optional[str]]  # The literal a rule matches, or None for a rule built from other rules
+    productions: List[tuple[tuple[int, ...], ...]]  # The alternatives of a rule, each a sequence of rule ids
+    # Strongly connected groups of rules, each only referring to itself and to the groups before it
+    components: List[tuple[int, ...]]
+    cyclic: List[bool]  # Whether each component refers to itself and needs iterating to a fixed point
 
 
-def readFile(file: TextIO):
+def main(args: MainArgs):
+    with args.file.open('r') as file:
+        grammar, messages = readFile(file)
+
+    print(countMatches(grammar, messages, args.backend, args.workers))
+
+
+def countMatches(grammar: Grammar, messages: List[str],
+                 backend: Literal['auto', 'chart', 'regex'] = 'auto', workers: int = 1) -> int:
+    source = None
+    if backend != 'chart':
+        source = regexSource(grammar, 0, max(map(len, messages), default=0))
+        if source is None and backend == 'regex':
+            raise ValueError('The rules have loops that cannot be unrolled into a regular expression')
+    if workers == 1:
+        return countChunk(grammar, source, messages)
+    chunkSize = max(1, -(-len(messages) // (workers * 4)))
+    with ProcessPoolExecutor(workers) as executor:
+        return sum(executor.map(partial(countChunk, grammar, source),
+                                (messages[i:i + chunkSize] for i in range(0, len(messages), chunkSize))))
+
+
+def countChunk(grammar: Grammar, source: Optional[str], messages: List[str]) -> int:
+    if source is None:
+        return sum(1 for message in messages if matches(grammar, message))
+    # re caches compiled patterns, so each worker process only compiles the expression once
+    pattern = re.compile(source)
+    return sum(1 for message in messages if pattern.fullmatch(message))
+
+
+def regexSource(grammar: Grammar, rule: int, longest: int) -> Optional[str]:
+    # Rules without loops translate directly into a regular expression. A loop can be unrolled as long as it is a
+    # single rule referring to itself at most once per alternative (like 8: 42 | 42 8 and 11: 42 31 | 42 11 31):
+    # each level of nesting then costs at least the shortest match of the rest of the alternative, which bounds
+    # the unrolling by the longest message. Unrolled loops used several times over can still blow up, so give up
+    # past PATTERN_LIMIT.
+    letters, productions = grammar.letters, grammar.productions
+    for component, cyclic in zip(grammar.components, grammar.cyclic):
+        if cyclic and (len(component) > 1 or any(production.count(component[0]) > 1
+                                                 for production in productions[component[0]])):
+            return None
+
+    # The shortest match of each rule, and whether its expression depends on how many letters are left
+    shortest = [0] * len(letters)
+    bounded = [False] * len(letters)
+    for component, cyclic in zip(grammar.components, grammar.cyclic):
+        id = component[0]
+        if letters[id] is not None:
+            shortest[id] = len(letters[id])
+            continue
+        # The recursive alternatives of a loop are never the shortest, so leave them out
+        shortest[id] = min((sum(shortest[part] for part in production)
+                            for production in productions[id] if id not in production),
+                           default=longest + 1)
+        bounded[id] = cyclic or any(bounded[part] for production in productions[id] for part in production)
+
+    expressions = {}
+    tooLong = False
+
+    def expression(rule: int, budget: Optional[int]) -> Optional[str]:
+        # Only rules that depend on a loop are limited to a budget of letters, the others are always the same
+        nonlocal tooLong
+        if tooLong or (budget is not None and shortest[rule] > budget):
+            return None
+        key = (rule, budget)
+        if key in expressions:
+            return expressions[key]
+        if letters[rule] is not None:
+            expressions[key] = re.escape(letters[rule])
+            return expressions[key]
+        alternatives = []
+        for production in productions[rule]:
+            total = sum(shortest[part] for part in production)
+            if production == (rule,) or (budget is not None and total > budget):
+                continue
+            parts = [expression(part, budget - total + shortest[part] if bounded[part] else None)
+                     for part in production]
+            if None not in parts:
+                alternatives.append(''.join(parts))
+        if not alternatives:
+            expressions[key] = None
+        elif len(alternatives) == 1:
+            expressions[key] = alternatives[0]
+        else:
+            expressions[key] = f'(?:{"|".join(alternatives)})'
+        if expressions[key] is not None and len(expressions[key]) > PATTERN_LIMIT:
+            tooLong = True
+        return expressions[key]
+
+    source = expression(rule, longest if bounded[rule] else None)
+    if tooLong:
+        return None
+    # A grammar that can't match anything compiles to a pattern that never matches
+    return source or '(?!)'
+
+
+def matches(grammar: Grammar, message: str, rule: int = 0) -> bool:
+    return chart(grammar, message)[rule].get(len(message), 0) & 1 == 1
+
+
+def chart(grammar: Grammar, message: str) -> List[dict[int, int]]:
+    # A bit-parallel CYK chart: spans[rule][length] has bit s set if rule matches the length letters from offset s,
+    # so every start offset is tested at once with big-integer shifts and ANDs instead of copying substrings
+    n = len(message)
+    spans: List[dict[int, int]] = [{} for _ in grammar.letters]
+    found = {}
+    for component, cyclic in zip(grammar.components, grammar.cyclic):
+        if not cyclic:
+            rule = component[0]
+            letter = grammar.letters[rule]
+            if letter is not None:
+                if letter not in found:
+                    found[letter] = sum(1 << match.start()
+                                        for match in re.finditer(f'(?={re.escape(letter)})', message))
+                if found[letter]:
+                    spans[rule] = {len(letter): found[letter]}
+            else:
+                spans[rule] = derive(spans, grammar.productions[rule], n)
+            continue
+
+        # Recursive rules only ever gain spans, and no span is longer than the message, so this terminates
+        changed = True
+        while changed:
+            changed = False
+            for rule in component:
+                derived = derive(spans, grammar.productions[rule], n)
+                if derived != spans[rule]:
+                    spans[rule] = derived
+                    changed = True
+    return spans
+
+
+def derive(spans: List[dict[int, int]], productions: tuple[tuple[int, ...], ...], n: int) -> dict[int, int]:
+    derived = {}
+    for production in productions:
+        prefixes = {0: (1 << n + 1) - 1}
+        for part in production:
+            extended = {}
+            for length, starts in prefixes.items():
+                for partLength, partStarts in spans[part].items():
+                    if length + partLength <= n and (both := starts & partStarts >> length):
+                        extended[length + partLength] = extended.get(length + partLength, 0) | both
+            prefixes = extended
+            if not prefixes:
+                break
+        for length, starts in prefixes.items():
+            derived[length] = derived.get(length, 0) | starts
+    return derived
+
+
+def compileRules(rules: dict[int, str]) -> Grammar:
+    exactPattern = re.compile(r'^"(?P<letter>\w+)"\s*$')
+    size = max(rules) + 1
+    letters: List[Optional[str]] = [None] * size
+    productions: List[tuple[tuple[int, ...], ...]] = [()] * size
+    for id, rule in rules.items():
+        if (match := exactPattern.match(rule)):
+            letters[id] = match.group('letter')
+        else:
+            productions[id] = tuple(tuple(int(part) for part in branch.split()) for branch in rule.split('|'))
+            for part in (part for production in productions[id] for part in production):
+                if part not in rules:
+                    raise ValueError(f'Rule {id} refers to undefined rule {part}')
+
+    # https://en.wikipedia.org/wiki/Tarjan%27s_strongly_connected_components_algorithm
+    # Tarjan emits each component after every component it refers to, which is the order the chart is filled in
+    index = [-1] * size
+    lowLink = [0] * size
+    onStack = bytearray(size)
+    stack = []
+    components = []
+    visited = 0
+
+    def connect(rule: int):
+        nonlocal visited
+        index[rule] = lowLink[rule] = visited
+        visited += 1
+        stack.append(rule)
+        onStack[rule] = 1
+        for part in (part for production in productions[rule] for part in production):
+            if index[part] < 0:
+                connect(part)
+                lowLink[rule] = min(lowLink[rule], lowLink[part])
+            elif onStack[part]:
+                lowLink[rule] = min(lowLink[rule], index[part])
+        if lowLink[rule] == index[rule]:
+            component = []
+            while not component or component[-1] != rule:
+                component.append(stack.pop())
+                onStack[component[-1]] = 0
+            components.append(tuple(component))
+
+    for id in rules:
+        if index[id] < 0:
+            connect(id)
+    cyclic = [len(component) > 1 or any(component[0] in production for production in productions[component[0]])
+              for component in components]
+    return Grammar(letters, productions, components, cyclic)
+
+
+def readFile(file: TextIO) -> tuple[Grammar, List[str]]:
     rules = {}
     rulePattern = re.compile(r'^(?P<id>\d+): (?P<rule>.+)\s*$')
-    exactPattern = re.compile(r'^"(?P<letter>\w+)"\s*$')
 
     for line in file:
         if not (match := rulePattern.match(line)):
             break
-        id = int(match.group('id'))
-        line = match.group('rule')
-        if (match := exactPattern.match(line)):
-            def exact(messages: set[str], letter=match.group('letter')) -> set[str]:
-                return {message[len(letter):]
-                        for message in messages
-                        if len(message) >= len(letter) and message[:len(letter)] == letter}
-
-            rules[id] = exact
-        else:
-            def nested(messages: set[str],
-                       cases=tuple([int(id) for id in branch.split()] for branch in line.split('|'))) \
-                    -> set[str]:
-                cases = (reduce(
-                    lambda m, f: m if len(m) == 0 else f(m),
-                    (rules[c] for c in case),
-                    messages)
-                    for case in cases)
-                return {r for c in cases for r in c}
-
-            rules[id] = nested
+        rules[int(match.group('id'))] = match.group('rule')
 
     messages = []
     for line in file:
         messages.append(line.rstrip())
 
-    return rules, messages
+    return compileRules(rules), messages
 
 
 if __name__ == '__main__':
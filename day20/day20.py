@@ -1,3 +1,4 @@
+import math
 import numpy as np
 import pathlib
 import re
@@ -9,7 +10,8 @@ from typing import TextIO
 from typing import Union
 
 TILE = tuple[np.ndarray, np.ndarray]
-TILE_EDGE = tuple[np.ndarray, np.ndarray, slice]
+# Canonical edge -> (tile, side, flipped) for every tile edge with that canonical form
+EDGE_INDEX = dict[int, List[tuple[int, int, bool]]]
 
 FLIP = slice(None, None, -1)  # For convenience, not in SLICES
 
@@ -23,6 +25,10 @@ LEFT = (slice(None), slice(None, 1))
 LEFT_FLIP = (FLIP, LEFT[1])
 SLICES = [TOP, TOP_FLIP, RIGHT, RIGHT_FLIP, BOTTOM, BOTTOM_FLIP, LEFT, LEFT_FLIP]
 
+# The 8 rotations and reflections of a tile, as views
+ORIENTATIONS = [lambda array, k=k, flip=flip: np.rot90(np.fliplr(array) if flip else array, k)
+                for flip in (False, True) for k in range(4)]
+
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with a series of tiles
@@ -34,9 +40,11 @@ class MainArgs(Tap):
 def main(args: MainArgs):
     with args.file.open('r') as file:
         unmatched = list(readTiles(file))
-    ids, image = solve(unmatched)
+    corners, _ = findBorders(indexEdges(unmatched), len(unmatched))
     # .item() needed to convert from int32->int and avoid overflow
-    print(ids[0, 0].item() * ids[0, -1].item() * ids[-1, 0].item() * ids[-1, -1].item())
+    print(math.prod(unmatched[corner][0].item() for corner in corners))
+
+    ids, image = assemble(unmatched)
 
     image = removeBorders(ids.shape, image)
 
@@ -51,19 +59,22 @@ def main(args: MainArgs):
 
 
 def replaceMonsters(image: np.ndarray, monster: np.ndarray) -> np.ndarray:
-    monsterSize = np.count_nonzero(monster)
-
-    for _ in range(2):
-        for _ in range(4):
-            for x in range(image.shape[0] - monster.shape[0] + 1):
-                for y in range(image.shape[1] - monster.shape[1] + 1):
-                    window = slice(x, x + monster.shape[0]), slice(y, y + monster.shape[1])
-                    comparison = image[window] == monster
-                    if np.count_nonzero(comparison) == monsterSize:
-                        image[window] = np.where(comparison, 'O', image[window])
-            monster = np.rot90(monster)
-        monster = np.fliplr(monster)
-    return image
+    # Every '#' in the monster must be a '#' in the image; for each orientation a window's top-left corner
+    # matches if it survives ANDing the image shifted by each of the monster's cells
+    rough = image == '#'
+    found = np.zeros(image.shape, dtype=bool)
+    for orientation in ORIENTATIONS:
+        pattern = orientation(monster == '#')
+        height, width = image.shape[0] - pattern.shape[0] + 1, image.shape[1] - pattern.shape[1] + 1
+        if height <= 0 or width <= 0:
+            continue
+        cells = np.argwhere(pattern)
+        matches = np.ones((height, width), dtype=bool)
+        for row, column in cells:
+            matches &= rough[row:row + height, column:column + width]
+        for row, column in cells:
+            found[row:row + height, column:column + width] |= matches
+    return np.where(found, 'O', image)
 
 
 def removeBorders(shape: tuple, image: np.ndarray):
@@ -73,116 +84,80 @@ def removeBorders(shape: tuple, image: np.ndarray):
     return image
 
 
-def solve(unmatched: List[TILE]) -> TILE:
-    unmatched = match(unmatched)
-    while len(unmatched) > 1:
-        toBreak = None
-        for i in range(len(unmatched)):
-            if unmatched[i][0].size > 1:
-                toBreak = unmatched.pop(i)
-                break
-        tiles = breakup(toBreak)
-        unmatched.extend(tiles)
-        unmatched = match(unmatched)
-    return unmatched[0]
-
-
-def edge(array: np.ndarray, slice: slice) -> str:
-    return ''.join(array[slice].squeeze())
-
-
-def match(unmatched: List[TILE]) -> List[TILE]:
-    edges: dict[str, TILE_EDGE] = {}
-    while unmatched:
-        id, array = unmatched.pop(0)
-        if match := findMatch(edges, array):
-            slice, match = match
-            _, match_array, _ = match
-            for s in SLICES:
-                e = edge(match_array, s)
-                del edges[e]
-            unmatched.append(stitch((id, array, slice), match))
-        else:
-            for s in SLICES:
-                e = edge(array, s)
-                edges[e] = id, array, s
-
-    # Reassemble the remaining piece(s) from their TILE_EDGEs.
-    # SLICES[0] is arbitrary, just needs to be consistent so we don't duplicate tiles
-    return [(id, array) for id, array, slice in edges.values() if slice == SLICES[0]]
-
-
-def findMatch(edges: dict[str, TILE_EDGE], array: np.ndarray) -> Union[tuple[slice, TILE_EDGE], None]:
-    for slice in SLICES:
-        e = edge(array, slice)
-        if match := edges.get(e):
-            return slice, match
-    return None
-
-
-def stitch(tile1: TILE_EDGE, tile2: TILE_EDGE) -> TILE:
-    # To simplify stitching, we'll manipulate the tiles first
-
-    # Side note: if slice were hashable, this would be much cleaner as a dictionary of lambdas
-    # Could work around by making hashable classes, but just doing the if-elif tree for now
-
-    # Make matching edge the bottom of tile1
-    tile_1_id, tile_1_array, tile_1_slice = tile1
-    if tile_1_slice == BOTTOM_FLIP:
-        tile_1_id = np.fliplr(tile_1_id)
-        tile_1_array = np.fliplr(tile_1_array)
-    elif tile_1_slice == TOP:
-        tile_1_id = np.flipud(tile_1_id)
-        tile_1_array = np.flipud(tile_1_array)
-    elif tile_1_slice == TOP_FLIP:
-        tile_1_id = np.flipud(np.fliplr(tile_1_id))
-        tile_1_array = np.flipud(np.fliplr(tile_1_array))
-    elif tile_1_slice == LEFT:
-        tile_1_id = np.rot90(tile_1_id)
-        tile_1_array = np.rot90(tile_1_array)
-    elif tile_1_slice == LEFT_FLIP:
-        tile_1_id = np.rot90(np.flipud(tile_1_id))
-        tile_1_array = np.rot90(np.flipud(tile_1_array))
-    elif tile_1_slice == RIGHT:
-        tile_1_id = np.rot90(np.fliplr(tile_1_id))
-        tile_1_array = np.rot90(np.fliplr(tile_1_array))
-    elif tile_1_slice == RIGHT_FLIP:
-        tile_1_id = np.rot90(tile_1_id, axes=(1, 0))
-        tile_1_array = np.rot90(tile_1_array, axes=(1, 0))
-
-    # Make matching edge the top of tile2
-    tile_2_id, tile_2_array, tile_2_slice = tile2
-    if tile_2_slice == TOP_FLIP:
-        tile_2_id = np.fliplr(tile_2_id)
-        tile_2_array = np.fliplr(tile_2_array)
-    elif tile_2_slice == BOTTOM:
-        tile_2_id = np.flipud(tile_2_id)
-        tile_2_array = np.flipud(tile_2_array)
-    elif tile_2_slice == BOTTOM_FLIP:
-        tile_2_id = np.rot90(tile_2_id, 2)
-        tile_2_array = np.rot90(tile_2_array, 2)
-    elif tile_2_slice == LEFT:
-        tile_2_id = np.rot90(np.fliplr(tile_2_id))
-        tile_2_array = np.rot90(np.fliplr(tile_2_array))
-    elif tile_2_slice == LEFT_FLIP:
-        tile_2_id = np.rot90(tile_2_id, axes=(1, 0))
-        tile_2_array = np.rot90(tile_2_array, axes=(1, 0))
-    elif tile_2_slice == RIGHT:
-        tile_2_id = np.rot90(tile_2_id)
-        tile_2_array = np.rot90(tile_2_array)
-    elif tile_2_slice == RIGHT_FLIP:
-        tile_2_id = np.rot90(np.flipud(tile_2_id))
-        tile_2_array = np.rot90(np.flipud(tile_2_array))
-
-    # Now simply concatenate the tiles
-    return np.concatenate((tile_1_id, tile_2_id)), np.concatenate((tile_1_array, tile_2_array))
-
-
-def breakup(tile: TILE) -> Iterable[TILE]:
-    ids, arrays = tile
-    return list(zip(
-        (y for x in np.split(ids, ids.shape[0], 0) for y in np.split(x, ids.shape[1], 1)),
-        (y for x in np.split(arrays, ids.shape[0], 0) for y in np.split(x, ids.shape[1], 1))))
+def assemble(tiles: List[TILE]) -> TILE:
+    index = indexEdges(tiles)
+    corners, _ = findBorders(index, len(tiles))
+    size = math.isqrt(len(tiles))
+    height, width = tiles[0][1].shape
+    placed = np.zeros((size, size), dtype=int)
+    ids = np.zeros((size, size), dtype=tiles[0][0].dtype)
+    image = np.empty((size * height, size * width), dtype=tiles[0][1].dtype)
+
+    def cell(row: int, column: int) -> tuple[slice, slice]:
+        return slice(row * height, (row + 1) * height), slice(column * width, (column + 1) * width)
+
+    # Orient a corner so its unmatched edges are on the top and left, then fill in row by row,
+    # matching each tile to the one on its left (or above, at the start of a row)
+    tile = corners[0]
+    array = next(array for array in orientations(tiles[tile][1])
+                 if len(index[canonical(array, TOP)]) == 1 and len(index[canonical(array, LEFT)]) == 1)
+    for row in range(size):
+        for column in range(size):
+            if column > 0:
+                tile, array = neighbor(tiles, index, placed[row, column - 1], image[cell(row, column - 1)], RIGHT, LEFT)
+            elif row > 0:
+                tile, array = neighbor(tiles, index, placed[row - 1, column], image[cell(row - 1, column)], BOTTOM, TOP)
+            placed[row, column] = tile
+            ids[row, column] = tiles[tile][0].item()
+            image[cell(row, column)] = array
+    return ids, image
+
+
+def neighbor(tiles: List[TILE], index: EDGE_INDEX, tile: int, array: np.ndarray,
+             side: Union[slice, tuple[slice, slice]], opposite: Union[slice, tuple[slice, slice]]) \
+        -> tuple[int, np.ndarray]:
+    # The tile across the given side, oriented so its opposite side lines up
+    code = edge(array, side)
+    other = next(other for other, _, _ in index[canonical(array, side)] if other != tile)
+    return other, next(array for array in orientations(tiles[other][1]) if edge(array, opposite) == code)
+
+
+def orientations(array: np.ndarray) -> Iterable[np.ndarray]:
+    return (orientation(array) for orientation in ORIENTATIONS)
+
+
+def edge(array: np.ndarray, slice: slice) -> int:
+    return edgeCode(array[slice].ravel() == '#')
+
+
+def canonical(array: np.ndarray, slice: slice) -> int:
+    # Each edge and its reversal share the smaller of their two codes
+    bits = array[slice].ravel() == '#'
+    return min(edgeCode(bits), edgeCode(bits[::-1]))
+
+
+def edgeCode(bits: np.ndarray) -> int:
+    # The edge's bits as an integer, first cell lowest, with a leading 1 so edges of different lengths differ
+    return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little') | 1 << bits.size
+
+
+def indexEdges(tiles: List[TILE]) -> EDGE_INDEX:
+    index = {}
+    for tile, (_, array) in enumerate(tiles):
+        for side in range(4):
+            code, reversed = edge(array, SLICES[2 * side]), edge(array, SLICES[2 * side + 1])
+            index.setdefault(min(code, reversed), []).append((tile, side, reversed < code))
+    return index
+
+
+def findBorders(index: EDGE_INDEX, count: int) -> tuple[List[int], List[int]]:
+    # Corner tiles have two edges that match nothing, other border tiles have one
+    unmatched = [0] * count
+    for matches in index.values():
+        if len(matches) == 1:
+            unmatched[matches[0][0]] += 1
+    return ([tile for tile, edges in enumerate(unmatched) if edges == 2],
+            [tile for tile, edges in enumerate(unmatched) if edges == 1])
 
 
 def readTiles(file: TextIO) -> Iterable[TILE]:
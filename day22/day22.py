@@ -1,5 +1,12 @@
 import pathlib
+from collections import OrderedDict
+from collections import deque
+from dataclasses import dataclass
+from dataclasses import field
+from functools import partial
+from itertools import islice
 from typing import Callable
+from typing import Iterable
 from typing import Literal
 from typing import NewType
 from typing import TextIO
@@ -10,48 +17,98 @@ PLAYER = Literal[1, 2]
 Card = NewType('Card', int)
 Deck = NewType('Deck', list[Card])
 
+MODULUS = 2 ** 61 - 1  # A Mersenne prime
+BASE = 1_000_003
+INVERSE = pow(BASE, -1, MODULUS)
+
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with the two decks
+    cache: int = 2 ** 16  # The number of sub-game results to remember
+    stats: bool = False  # Print sub-game cache statistics
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
 
 
+@dataclass
+class Subgames:
+    size: int
+    # Winners of recent sub-games, least recently used first
+    results: OrderedDict[tuple[tuple[Card, ...], tuple[Card, ...]], PLAYER] = field(default_factory=OrderedDict)
+    hits: int = 0
+    misses: int = 0
+    skipped: int = 0
+
+
 def main(args: MainArgs):
     with args.file.open('r') as file:
         deck1, deck2 = readDecks(file)
     winner, deck = war(traditional, deck1[:], deck2[:])
     print(sum((i + 1) * c for i, c in enumerate(reversed(deck))))
-    winner, deck = war(recursive, deck1, deck2)
+    subgames = Subgames(args.cache)
+    winner, deck = war(partial(recursive, subgames=subgames), deck1, deck2)
     print(sum((i + 1) * c for i, c in enumerate(reversed(deck))))
+    if args.stats:
+        print(f'sub-games: {subgames.hits} cache hits, {subgames.misses} misses, {subgames.skipped} skipped')
 
 
 def war(fight: Callable[[Card, Card, Deck, Deck], PLAYER], deck1: Deck, deck2: Deck) -> tuple[PLAYER, Deck]:
-    rounds = set()
+    start1, start2 = deck1, deck2
+    deck1, deck2 = deque(deck1), deque(deck2)
+    # Rounds are remembered by a rolling hash of each deck, sum(card * BASE^position), which is updated
+    # in O(1) as cards move; a repeated hash is confirmed by replaying the recorded round winners
+    powers = [1]
+    for _ in range(len(deck1) + len(deck2)):
+        powers.append(powers[-1] * BASE % MODULUS)
+    hash1, hash2 = deckHash(deck1), deckHash(deck2)
+    rounds: dict[tuple[int, int, int], list[int]] = dict()
+    winners = bytearray()
     winner: PLAYER
     deck: Deck
     while deck1 and deck2:
-        td1, td2 = tuple(deck1), tuple(deck2)
-        if (td1, td2) in rounds:
-            winner = 1
-            deck = deck1
-            return winner, deck
-        rounds.add((td1, td2))
-        card1, card2 = deck1.pop(0), deck2.pop(0)
+        key = (hash1, hash2, len(deck1))
+        for previous in rounds.get(key, ()):
+            if replay(start1, start2, winners[:previous]) == (deck1, deck2):
+                winner = 1
+                deck = Deck(list(deck1))
+                return winner, deck
+        rounds.setdefault(key, []).append(len(winners))
+        card1, card2 = deck1.popleft(), deck2.popleft()
+        hash1 = (hash1 - card1) * INVERSE % MODULUS
+        hash2 = (hash2 - card2) * INVERSE % MODULUS
         if fight(card1, card2, deck1, deck2) == 1:
+            hash1 = (hash1 + card1 * powers[len(deck1)] + card2 * powers[len(deck1) + 1]) % MODULUS
             deck1.extend([card1, card2])
+            winners.append(1)
         else:
+            hash2 = (hash2 + card2 * powers[len(deck2)] + card1 * powers[len(deck2) + 1]) % MODULUS
             deck2.extend([card2, card1])
+            winners.append(2)
     if deck1:
         winner = 1
-        deck = deck1
+        deck = Deck(list(deck1))
     else:
         winner = 2
-        deck = deck2
+        deck = Deck(list(deck2))
     return winner, deck
 
 
+def replay(deck1: Deck, deck2: Deck, winners: bytes) -> tuple[deque[Card], deque[Card]]:
+    deck1, deck2 = deque(deck1), deque(deck2)
+    for winner in winners:
+        card1, card2 = deck1.popleft(), deck2.popleft()
+        if winner == 1:
+            deck1.extend([card1, card2])
+        else:
+            deck2.extend([card2, card1])
+    return deck1, deck2
+
+
+def deckHash(deck: Iterable[Card]) -> int:
+    return sum(card * pow(BASE, position, MODULUS) for position, card in enumerate(deck)) % MODULUS
+
+
 def traditional(card1: Card, card2: Card, *_) -> PLAYER:
     winner: PLAYER
     if card1 > card2:
@@ -61,10 +118,25 @@ def traditional(card1: Card, card2: Card, *_) -> PLAYER:
     return winner
 
 
-def recursive(card1: Card, card2: Card, deck1: Deck, deck2: Deck) -> PLAYER:
+def recursive(card1: Card, card2: Card, deck1: Deck, deck2: Deck, subgames: Subgames) -> PLAYER:
     if len(deck1) < card1 or len(deck2) < card2:
         return traditional(card1, card2)
-    winner, _ = war(traditional, deck1[:card1], deck2[:card2])
+    subdeck1, subdeck2 = tuple(islice(deck1, card1)), tuple(islice(deck2, card2))
+    # Player 1 never loses the highest card, so can only win (outright or by a repeated round)
+    if max(subdeck1) > max(subdeck2):
+        subgames.skipped += 1
+        return 1
+    key = subdeck1, subdeck2
+    winner = subgames.results.get(key)
+    if winner is not None:
+        subgames.hits += 1
+        subgames.results.move_to_end(key)
+        return winner
+    subgames.misses += 1
+    winner, _ = war(traditional, Deck(list(subdeck1)), Deck(list(subdeck2)))
+    subgames.results[key] = winner
+    if len(subgames.results) > subgames.size:
+        subgames.results.popitem(last=False)
     return winner
 
 
@@ -1,5 +1,7 @@
 import pathlib
-from dataclasses import dataclass
+import time
+from array import array
+from typing import Optional
 from typing import TextIO
 
 from tap import Tap
@@ -7,92 +9,92 @@ from tap import Tap
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with a starting cup order
+    cups: Optional[int] = None  # Benchmark: the total number of cups
+    moves: Optional[int] = None  # Benchmark: the number of moves to make
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
 
 
-@dataclass
-class Cup:
-    label: int
-    next: 'Cup'
-
-
 def main(args: MainArgs):
+    if args.cups is not None or args.moves is not None:
+        benchmark(args)
+        return
+
     with args.file.open('r') as file:
-        cups, minCup, maxCup = readCups(file)
-    cups = cupGame(cups, 100, minCup, maxCup)
-    cups = find(cups, 1)
-    current = cups.next
+        cups, current, minCup, maxCup = readCups(file)
+    current = cupGame(cups, current, 100, minCup, maxCup)
+    one = find(cups, current, 1)
+    current = cups[one]
     solution = ''
-    while current != cups:
-        solution += str(current.label)
-        current = current.next
+    while current != one:
+        solution += str(current)
+        current = cups[current]
     print(solution)
 
     with args.file.open('r') as file:
-        cups, minCup, maxCup = readCups(file, 10 ** 6)
-    cups = cupGame(cups, 10 ** 7, minCup, maxCup)
-    cups = find(cups, 1)
-    print(cups.next.label * cups.next.next.label)
-
-
-def cupGame(cups: Cup, moves: int, minCup: int, maxCup: int) -> Cup:
-    labels = {cups.label: cups}
-    current = cups.next
-    while current != cups:
-        labels[current.label] = current
-        current = current.next
+        cups, current, minCup, maxCup = readCups(file, 10 ** 6)
+    current = cupGame(cups, current, 10 ** 7, minCup, maxCup)
+    one = find(cups, current, 1)
+    print(cups[one] * cups[cups[one]])
+
+
+def benchmark(args: MainArgs):
+    moves = 10 ** 7 if args.moves is None else args.moves
+    with args.file.open('r') as file:
+        start = time.perf_counter()
+        cups, current, minCup, maxCup = readCups(file, args.cups)
+    setup = time.perf_counter() - start
+    start = time.perf_counter()
+    cupGame(cups, current, moves, minCup, maxCup)
+    elapsed = time.perf_counter() - start
+    print(f'cups: {maxCup}, moves: {moves}')
+    print(f'setup: {setup:.3f}s, {cups.itemsize * len(cups) / 2 ** 20:.1f} MiB')
+    print(f'game: {elapsed:.3f}s, {moves / elapsed:,.0f} moves/s')
+
+
+# cups[label] is the label of the cup clockwise from label
+def cupGame(cups: array, current: int, moves: int, minCup: int, maxCup: int) -> int:
     for _ in range(moves):
-        moving = set()
-        first = cups.next
-        last = cups
-        for _ in range(3):
-            last = last.next
-            moving.add(last.label)
-        target = cups.label - 1 if cups.label > minCup else maxCup
-        while target in moving:
+        first = cups[current]
+        second = cups[first]
+        third = cups[second]
+        target = current - 1 if current > minCup else maxCup
+        while target == first or target == second or target == third:
             target = target - 1 if target > minCup else maxCup
-        destination = labels[target]
-        cups.next, destination.next, last.next = last.next, first, destination.next
-        cups = cups.next
-    return cups
+        cups[current] = cups[third]
+        cups[third] = cups[target]
+        cups[target] = first
+        current = cups[current]
+    return current
 
 
-def find(current: Cup, target: int) -> Cup:
+def find(cups: array, current: int, target: int) -> int:
     start = current
-    while current.label != target:
-        if current.next == start:
+    while current != target:
+        if cups[current] == start:
             return start
-        current = current.next
+        current = cups[current]
     return current
 
 
-def readCups(file: TextIO, maxCup: int = None) -> tuple[Cup, int, int]:
-    tail = None
-    minCup = 10 ** 4
-    maxRead = -1
-    for digit in reversed(list(next(file).rstrip())):
-        label = int(digit)
-        if label > maxRead:
-            maxRead = label
-        if label < minCup:
-            minCup = label
-        tail = Cup(label, tail)
-    head = tail
-    while tail.next is not None:
-        tail = tail.next
-
-    if maxCup is None:
+def readCups(file: TextIO, maxCup: int = None) -> tuple[array, int, int, int]:
+    labels = [int(digit) for digit in next(file).rstrip()]
+    minCup = min(labels)
+    maxRead = max(labels)
+    if maxCup is None or maxCup < maxRead:
         maxCup = maxRead
-        tail.next = head
+
+    cups = array('I', range(1, maxCup + 2))
+    for label, nextLabel in zip(labels, labels[1:]):
+        cups[label] = nextLabel
+    if maxCup > maxRead:
+        cups[labels[-1]] = maxRead + 1
+        cups[maxCup] = labels[0]
     else:
-        newTail = Cup(maxCup, head)
-        for label in range(maxCup - 1, maxRead, -1):
-            newTail = Cup(label, newTail)
-        tail.next = newTail
+        cups[labels[-1]] = labels[0]
 
-    return head, minCup, maxCup
+    return cups, labels[0], minCup, maxCup
 
 
 if __name__ == '__main__':
@@ -1,8 +1,8 @@
 import pathlib
-import re
-from functools import reduce
-from typing import Iterable
+import time
+from typing import List
 from typing import Literal
+from typing import Optional
 from typing import TextIO
 from typing import get_args
 
@@ -14,67 +14,99 @@ Direction = Literal['ne', 'e', 'se', 'sw', 'w', 'nw']
 
 class MainArgs(Tap):
     file: pathlib.Path  # A text file with a list of directions
-    size: int  # The size of the floor
+    size: Optional[int] = None  # The minimum initial size of the floor (it grows as needed)
     cycles: int  # The number of cycles to use for part 2
+    benchmark: List[int] = []  # Benchmark: time part 2 for each of these numbers of cycles
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
-        self.add_argument('size')
+        self.add_argument('size', nargs='?')
         self.add_argument('cycles')
 
 
 def main(args: MainArgs):
-    # I'd like to make this an expanding array, but a static size is much easier
     with args.file.open('r') as file:
-        directions = readDirections(file)
-        origin, floor = initializeFloor(args.size, directions)
+        counts = readDirections(file)
+    origin, floor = initializeFloor(counts, args.size)
     print(np.count_nonzero(floor))
+    if args.benchmark:
+        for cycles in args.benchmark:
+            start = time.perf_counter()
+            result = run(floor, cycles)
+            elapsed = time.perf_counter() - start
+            print(f'{cycles} cycles: {np.count_nonzero(result)} black tiles, floor {result.shape}, {elapsed:.3f}s')
+        return
     floor = run(floor, args.cycles)
     print(np.count_nonzero(floor))
 
 
 def run(floor: np.ndarray, cycles: int) -> np.ndarray:
+    floor = floor.copy()
+    rows, columns = np.nonzero(floor)
+    if len(rows) == 0:
+        return floor
+    # Only the bounding box of black tiles, plus a ring where new tiles can appear, is simulated;
+    # reading that ring's neighbors needs a second ring, and the floor grows when that runs out
+    top, bottom, left, right = rows.min(), rows.max() + 1, columns.min(), columns.max() + 1
     for _ in range(cycles):
-        actives = np.pad(np.where(floor, 1, 0), 1)
-        neighbors = np.sum([
-            actives[:-2, 2:],  # NE
-            actives[1:-1, 2:],  # E
-            actives[2:, 1:-1],  # SE
-            actives[2:, :-2],  # SW
-            actives[1:-1, :-2],  # W
-            actives[:-2, 1:-1],  # NW
-        ], 0)
-        update = np.where(np.logical_and(floor, np.logical_or(neighbors == 0, neighbors > 2)), 0, -1)
-        update = np.where(np.logical_and(~floor, neighbors == 2), 1, update)
-        floor = np.where(update != -1, update == 1, floor)
+        if top < 2 or left < 2 or bottom > floor.shape[0] - 2 or right > floor.shape[1] - 2:
+            margin = max(floor.shape) // 2 + 2
+            floor = np.pad(floor, margin)
+            top, bottom, left, right = top + margin, bottom + margin, left + margin, right + margin
+        actives = floor[top - 2:bottom + 2, left - 2:right + 2].view(np.uint8)
+        neighbors = (actives[:-2, 2:]  # NE
+                     + actives[1:-1, 2:]  # E
+                     + actives[2:, 1:-1]  # SE
+                     + actives[2:, :-2]  # SW
+                     + actives[1:-1, :-2]  # W
+                     + actives[:-2, 1:-1])  # NW
+        window = floor[top - 1:bottom + 1, left - 1:right + 1]
+        window[...] = np.where(window, np.logical_or(neighbors == 1, neighbors == 2), neighbors == 2)
+
+        rows = np.flatnonzero(window.any(1))
+        columns = np.flatnonzero(window.any(0))
+        if len(rows) == 0:
+            break
+        top, bottom = top - 1 + rows[0], top + rows[-1]
+        left, right = left - 1 + columns[0], left + columns[-1]
     return floor
 
 
-def initializeFloor(size: int, directions: Iterable[Iterable[Direction]]) -> tuple[tuple[int, int], np.ndarray]:
-    floor = np.zeros((size, size), dtype=bool)
-    origin = floor.shape[0] // 2, floor.shape[1] // 2
-    for path in directions:
-        destination = followPath(origin, path)
-        floor[destination] = ~floor[destination]
-    return origin, floor
-
-
-def followPath(origin: tuple[int, int], path: Iterable[Direction]) -> tuple[int, int]:
-    directions = {
-        'ne': (-1, 1),
-        'e': (0, 1),
-        'se': (1, 0),
-        'sw': (1, -1),
-        'w': (0, -1),
-        'nw': (-1, 0)
-    }
-    return tuple(reduce(lambda i, s: i + directions[s], path, np.array(origin)))
-
-
-def readDirections(file: TextIO) -> Iterable[Iterable[Direction]]:
-    pattern = re.compile('|'.join(get_args(Direction)))
-    # noinspection PyTypeChecker
-    return ((m.group(0) for m in pattern.finditer(line)) for line in file)
+def initializeFloor(counts: np.ndarray, size: Optional[int] = None) -> tuple[tuple[int, int], np.ndarray]:
+    # A path ends at the same tile whatever order its steps are taken in
+    vectors = np.array([
+        (-1, 1),  # NE
+        (0, 1),  # E
+        (1, 0),  # SE
+        (1, -1),  # SW
+        (0, -1),  # W
+        (-1, 0),  # NW
+    ])
+    destinations = counts @ vectors
+    low = destinations.min(0, initial=0) - 2
+    high = destinations.max(0, initial=0) + 3
+    if size is None:
+        shape = tuple(high - low)
+        origin = tuple(-low)
+    else:
+        # size is only a minimum, each axis grows to keep the padded destinations around a centered origin
+        radius = np.maximum(-low, high - 1)
+        shape = tuple(np.maximum(size, 2 * radius + 1).tolist())
+        origin = tuple(extent // 2 for extent in shape)
+    # A tile is black if it was flipped an odd number of times
+    flips = np.bincount(np.ravel_multi_index(tuple((destinations + origin).T), shape),
+                        minlength=shape[0] * shape[1])
+    return origin, (flips % 2 == 1).reshape(shape)
+
+
+def readDirections(file: TextIO) -> np.ndarray:
+    # The number of steps in each direction on each line, in the order of Direction;
+    # 'e' and 'w' also appear in the two-letter directions so those are subtracted
+    counts = []
+    for line in file:
+        ne, se, sw, nw = line.count('ne'), line.count('se'), line.count('sw'), line.count('nw')
+        counts.append((ne, line.count('e') - ne - se, se, sw, line.count('w') - sw - nw, nw))
+    return np.array(counts, dtype=np.int64).reshape(-1, len(get_args(Direction)))
 
 
 if __name__ == '__main__':
@@ -1,5 +1,11 @@
+import math
 import pathlib
+import random
+import time
+from dataclasses import dataclass
+from typing import Iterable
 from typing import Literal
+from typing import Optional
 from typing import TextIO
 
 from tap import Tap
@@ -11,6 +17,7 @@ class MainArgs(Tap):
     file: pathlib.Path  # A text file with two public keys
     base: int  # The base for each public key
     prime: int  # A prime
+    benchmark: list[int] = []  # Benchmark: sizes (in bits) of random primes to crack keys for
 
     def configure(self):
         self.add_argument('file', type=pathlib.Path)
@@ -18,29 +25,188 @@ class MainArgs(Tap):
         self.add_argument('prime')
 
 
+@dataclass
+class BabySteps:
+    base: int
+    prime: int
+    order: int  # The order of base
+    stride: int
+    steps: dict[int, int]  # base^j -> j for 0 <= j < stride
+    giantStep: int  # base^-stride
+
+
+@dataclass
+class DiscreteLog:
+    base: int
+    prime: int
+    order: int  # The order of base
+    # One table per prime factor q^e of the order, for base^(order / q) which has order q
+    subgroups: list[tuple[int, int, BabySteps]]
+
+
 def main(args: MainArgs):
+    if args.benchmark:
+        benchmark(args.base, args.benchmark)
+        return
+
     with args.file.open('r') as file:
         key1, key2 = readPublicKeys(file)
     secret1 = crack(key1, args.base, args.prime)
     print(modPower(key2, secret1, args.prime))
 
 
+def benchmark(base: int, sizes: Iterable[int], keys: int = 10):
+    for bits in sizes:
+        for kind, prime in (('random', randomPrime(bits)), ('smooth', smoothPrime(bits))):
+            # A smoothness of 1 skips factoring p - 1, leaving plain baby-step giant-step
+            for method, smoothness in (('bsgs', 1), ('pohlig-hellman', 2 ** 20)):
+                start = time.perf_counter()
+                log = discreteLog(base, prime, smoothness)
+                setup = time.perf_counter() - start
+                publicKeys = [modPower(base, random.randrange(prime - 1), prime) for _ in range(keys)]
+                start = time.perf_counter()
+                secrets = [solve(log, key) for key in publicKeys]
+                elapsed = time.perf_counter() - start
+                assert all(modPower(base, secret, prime) == key for secret, key in zip(secrets, publicKeys))
+                largest = max(q for q, _, _ in log.subgroups)
+                print(f'{bits} bits, {kind} prime {prime}, {method}: largest subgroup {largest}, '
+                      f'setup {setup:.3f}s, {elapsed / keys * 1000:.3f}ms/key')
+
+
 def crack(key: int, base: int, prime: int) -> int:
-    x = 1
-    k = 0
-    while x != key:
-        k += 1
-        x = x * base % prime
-    return k
+    secret = solve(discreteLog(base, prime), key)
+    if secret is None:
+        raise ValueError(f'{key} is not a power of {base} (mod {prime})')
+    return secret
 
 
 def modPower(base: int, exponent: int, mod: int):
+    # https://en.wikipedia.org/wiki/Modular_exponentiation#Right-to-left_binary_method
     x = 1
-    for _ in range(exponent):
-        x = x * base % mod
+    base %= mod
+    while exponent > 0:
+        if exponent & 1:
+            x = x * base % mod
+        base = base * base % mod
+        exponent >>= 1
+    return x
+
+
+def discreteLog(base: int, prime: int, smoothness: int = 2 ** 20) -> DiscreteLog:
+    factors, cofactor = factorize(prime - 1, smoothness)
+    if cofactor > 1:
+        # p - 1 isn't smooth, so treat the whole group as one "factor" and fall back to plain baby-step giant-step
+        order = prime - 1
+        return DiscreteLog(base, prime, order, [(order, 1, babySteps(base, prime, order))])
+
+    # Reduce p - 1 to the actual order of base so each subgroup generator has order exactly q
+    order = prime - 1
+    for q in factors:
+        while factors[q] > 0 and modPower(base, order // q, prime) == 1:
+            order //= q
+            factors[q] -= 1
+    return DiscreteLog(base, prime, order, [(q, e, babySteps(modPower(base, order // q, prime), prime, q))
+                                            for q, e in factors.items() if e > 0])
+
+
+def solve(log: DiscreteLog, key: int) -> Optional[int]:
+    # https://en.wikipedia.org/wiki/Pohlig%E2%80%93Hellman_algorithm
+    x, modulus = 0, 1
+    inverse = modPower(log.base, log.order - 1, log.prime)  # base^-1
+    for q, e, table in log.subgroups:
+        # Find x mod q^e one base-q digit at a time
+        digits = 0
+        for k in range(e):
+            target = modPower(key * modPower(inverse, digits, log.prime), log.order // q ** (k + 1), log.prime)
+            digit = giantSteps(table, target)
+            if digit is None:
+                return None
+            digits += digit * q ** k
+        # Combine with the Chinese remainder theorem, see day13
+        x = (x + modulus * (digits - x) * pow(modulus, -1, q ** e)) % (modulus * q ** e)
+        modulus *= q ** e
     return x
 
 
+def babySteps(base: int, prime: int, order: int) -> BabySteps:
+    # https://en.wikipedia.org/wiki/Baby-step_giant-step
+    stride = math.isqrt(order - 1) + 1 if order > 1 else 1
+    steps = dict()
+    x = 1
+    for j in range(stride):
+        steps.setdefault(x, j)
+        x = x * base % prime
+    return BabySteps(base, prime, order, stride, steps, modPower(x, prime - 2, prime))
+
+
+def giantSteps(table: BabySteps, key: int) -> Optional[int]:
+    x = key % table.prime
+    for i in range(0, table.order, table.stride):
+        j = table.steps.get(x)
+        if j is not None:
+            return i + j
+        x = x * table.giantStep % table.prime
+    return None
+
+
+def factorize(n: int, bound: int) -> tuple[dict[int, int], int]:
+    factors = dict()
+    q = 2
+    while q <= bound and q * q <= n:
+        while n % q == 0:
+            factors[q] = factors.get(q, 0) + 1
+            n //= q
+        q += 1 if q == 2 else 2
+    if 1 < n <= bound or (n > 1 and q * q > n):
+        # Whatever is left is prime
+        factors[n] = factors.get(n, 0) + 1
+        n = 1
+    return factors, n
+
+
+def isPrime(n: int) -> bool:
+    # https://en.wikipedia.org/wiki/Miller%E2%80%93Rabin_primality_test
+    # Deterministic for n < 3.3 * 10^24 with these witnesses
+    witnesses = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41)
+    if n < 2:
+        return False
+    for p in witnesses:
+        if n % p == 0:
+            return n == p
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in witnesses:
+        x = modPower(a, d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def randomPrime(bits: int) -> int:
+    while not isPrime(p := random.getrandbits(bits) | (1 << (bits - 1)) | 1):
+        pass
+    return p
+
+
+def smoothPrime(bits: int, smoothness: int = 2 ** 16) -> int:
+    # Build p - 1 out of small primes so that Pohlig-Hellman applies
+    smallPrimes = [q for q in range(3, smoothness, 2) if isPrime(q)]
+    while True:
+        n = 2
+        while (n + 1).bit_length() < bits:
+            n *= random.choice(smallPrimes)
+        if (n + 1).bit_length() == bits and isPrime(n + 1):
+            return n + 1
+
+
 def readPublicKeys(file: TextIO) -> tuple[int, int]:
     return int(next(file)), int(next(file))
 